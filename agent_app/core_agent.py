@@ -1,46 +1,277 @@
 # core_agent.py
+import functools
+import hashlib
+import locale
 import os
+import shutil
+import signal
+import stat
 import subprocess
 import tempfile
 import re
-from git import Repo
-from langchain.agents import AgentExecutor, create_react_agent
-from langchain.llms import LlamaCpp
-from langchain.tools import Tool
-from langchain_core.prompts import PromptTemplate
-from llm_utils import ask_llm_for_fix
+import threading
+from collections import deque
+from pathlib import Path
+from urllib.parse import urlsplit
+from llm_utils import MODEL_PATH, ask_llm_for_fixes, get_llm, parse_gradle_error_for_llm
 import time
 
-MODEL_PATH = "C:\\Users\\karth\\models\\Nous-Hermes-2-Mistral-7B-DPO.Q4_K_M.gguf"
+__all__ = [
+    "create_agent_executor",
+    "update_dependency",
+    "run_gradle_build",
+    "suggest_fixes",
+    "apply_fix",
+    "extract_repo_url",
+    "get_repo_dir",
+    "get_repo_lock",
+    "clone_repo",
+    "refresh_repo",
+    "snapshot_fix_targets",
+    "restore_fix_targets",
+    "record_fix_result",
+]
 
+# Cloned projects live in agent_app/temp
+_TEMP_ROOT = Path(__file__).parent / "temp"
 
-def create_agent_executor():
-    llm = LlamaCpp(
-        model_path=MODEL_PATH,
-        n_ctx=8192,
-        temperature=0.2,
-        verbose=True,
-    )
+# Matches the "ERROR_TYPE:", "FILE_TO_MODIFY:" and "FIX:" lines of an LLM
+# suggestion; labels must start a line and carry a value
+_SUGGESTION_RE = re.compile(r"(?m)^[ \t]*(ERROR_TYPE|FILE_TO_MODIFY|FIX):[ \t]*(\S.*)")
 
-    tools = [
-        Tool(
-            name="UpdateDependency",
-            func=update_dependency,
-            description="Updates the dependency version in gradle.properties"
-        ),
-        Tool(
-            name="GradleBuild",
-            func=run_gradle_build,
-            description="Runs gradle build and returns output"
-        ),
-        Tool(
-            name="FixBuild",
-            func=apply_fix,
-            description="Parses build error and applies fix in build.gradle or gradle.properties"
-        ),
+# Keep the daemon warm between attempts and reuse task outputs instead of cleaning
+GRADLE_FLAGS = ["--daemon", "--parallel", "--configure-on-demand", "--build-cache"]
+# Daemon heap comes from org.gradle.jvmargs in GRADLE_PERF_PROPS; a
+# -Dorg.gradle.jvmargs here would override it
+GRADLE_OPTS = "-Xmx2g"
+# Gradle speedups written into a project's gradle.properties unless the
+# project already sets them. Configuration cache problems are only reported,
+# so plugins that don't support it still build
+GRADLE_PERF_PROPS = {
+    "org.gradle.daemon": "true",
+    "org.gradle.parallel": "true",
+    "org.gradle.caching": "true",
+    "org.gradle.configuration-cache": "true",
+    "org.gradle.configuration-cache.problems": "warn",
+    "org.gradle.vfs.watch": "true",
+    "org.gradle.jvmargs": "-Xmx4g -XX:+UseParallelGC",
+}
+BUILD_TIMEOUT = 300
+# Only the end of a failing build's log is useful for diagnosis
+BUILD_TAIL_LINES = 4096
+# Lines still read after "FAILURE: Build failed" before the build is stopped
+FAILURE_GRACE_LINES = 200
+# Each build already uses every core (--parallel) and starts its own daemon
+# with a 4 GB heap that stays alive afterwards, so only a few run at once
+MAX_CONCURRENT_BUILDS = int(os.getenv("AGENT_MAX_BUILDS", "2"))
+_BUILD_SLOTS = threading.BoundedSemaphore(MAX_CONCURRENT_BUILDS)
+# Builds get their own process group so a timeout or early stop can kill
+# the wrapper together with everything it started
+if os.name == "nt":
+    _NEW_PROCESS_GROUP = {"creationflags": subprocess.CREATE_NEW_PROCESS_GROUP}
+else:
+    _NEW_PROCESS_GROUP = {"start_new_session": True}
+
+# Files apply_fix can patch
+_FIX_TARGETS = ("build.gradle", "gradle.properties")
+# The dependency line the suggested fix replaces in build.gradle
+_SPRING_WEB_DEP_RE = re.compile(r"^.*implementation.*spring-boot-starter-web.*$", re.M)
+
+# Dumping whole files to stdout is slow, so only do it when AGENT_DEBUG=1
+DEBUG = os.getenv("AGENT_DEBUG") == "1"
+
+# Suggestion cache: fixes whose build passed, keyed on the error and the
+# project files they were suggested for, so a recurring failure gets a known
+# good answer without another LLM call. Fixes that failed are never served
+# from it, so a repeated request samples new candidates instead
+_FIX_CACHE = {}
+_FIX_CACHE_SIZE = 256
+_FIX_CACHE_LOCK = threading.Lock()
+# Run-to-run noise in Gradle errors that shouldn't defeat the suggestion cache
+_ERROR_NOISE = (
+    (re.compile(r"\d{4}-\d{2}-\d{2}[T ]\d{2}:\d{2}:\d{2}(?:[.,]\d+)?"), "<time>"),
+    (re.compile(r"\b(in|took) (?:\d+h )?(?:\d+m )?\d+(?:\.\d+)?m?s\b"), r"\1 <duration>"),
+    (re.compile(r"(\.(?:java|kt|kts|groovy|gradle)):\d+(?::\d+)?"), r"\1:<line>"),
+    (re.compile(r"\bline:? \d+", re.IGNORECASE), "line <line>"),
+)
+
+# Per-checkout locks; requests working on the same checkout must not
+# interleave their resets, patches and builds
+_REPO_LOCKS = {}
+_REPO_LOCKS_LOCK = threading.Lock()
+
+# path -> (st_mtime_ns, st_size, text); saves re-reading unchanged files on retries
+_FILE_CACHE = {}
+# Encoding open() uses by default, so files written here read back unchanged
+_TEXT_ENCODING = locale.getpreferredencoding(False)
+# The process umask can only be read by setting it, so read it once at import
+_UMASK = os.umask(0)
+os.umask(_UMASK)
+
+
+def _cached_read(path):
+    path = os.fspath(path)
+    st = os.stat(path)
+    cached = _FILE_CACHE.get(path)
+    if cached and cached[0] == st.st_mtime_ns and cached[1] == st.st_size:
+        return cached[2]
+    with open(path, "r") as f:
+        text = f.read()
+    _FILE_CACHE[path] = (st.st_mtime_ns, st.st_size, text)
+    return text
+
+
+def _atomic_write(path, text):
+    # Write a sibling temp file and swap it in, so a failed write never
+    # leaves a half-patched file behind
+    # Encode once and hand the kernel the whole buffer, with the same newline
+    # and encoding handling open(path, "w") would apply; mkstemp's descriptor
+    # is already binary on Windows. Encoding first means text the encoding
+    # can't represent fails before any temp file exists
+    data = memoryview(text.replace("\n", os.linesep).encode(_TEXT_ENCODING))
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".tmp-")
+    try:
+        try:
+            while data:
+                data = data[os.write(fd, data):]
+        finally:
+            os.close(fd)
+        if os.path.exists(path):
+            shutil.copymode(path, tmp_path)
+        else:
+            # mkstemp creates 0600 files; give new files the mode open() would
+            os.chmod(tmp_path, 0o666 & ~_UMASK)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+    # Write through to the read cache so the next read of this file is free
+    st = os.stat(path)
+    _FILE_CACHE[os.fspath(path)] = (st.st_mtime_ns, st.st_size, text)
+
+
+@functools.lru_cache(maxsize=256)
+def _property_re(name):
+    # Matches every "name = value" line, tolerating spaces around "="
+    return re.compile(rf"(?m)^[ \t]*{re.escape(name)}[ \t]*=.*$")
+
+
+def _set_gradle_property(gradle_props_path, name, value):
+    if os.path.exists(gradle_props_path):
+        text = _cached_read(gradle_props_path)
+        
+        # Rewrite all matching lines in one pass
+        new_text, count = _property_re(name).subn(lambda _: f"{name}={value}", text)
+        if count:
+            print(f"[Step 3] Updated existing property {name} in gradle.properties")
+        else:
+            # Trim trailing newlines so repeated additions don't pile up blank lines
+            new_text = text.rstrip("\n") + f"\n{name}={value}\n"
+            print(f"[Step 3] Added new property {name} to gradle.properties")
+        _atomic_write(gradle_props_path, new_text)
+    else:
+        # Create gradle.properties if it doesn't exist
+        _atomic_write(gradle_props_path, f"{name}={value}\n")
+        print(f"[Step 3] Created new gradle.properties with {name}")
+
+
+def _ensure_perf_props(gradle_props_path):
+    text = _cached_read(gradle_props_path) if os.path.exists(gradle_props_path) else ""
+    missing = [
+        f"{name}={value}\n"
+        for name, value in GRADLE_PERF_PROPS.items()
+        if not _property_re(name).search(text)
     ]
+    if not missing:
+        return
+    # Append everything in one write; the project's own settings win
+    new_text = text.rstrip("\n") + "\n" if text.strip() else ""
+    _atomic_write(gradle_props_path, new_text + "".join(missing))
+    print(f"[Step 3] Added {len(missing)} Gradle performance properties to gradle.properties")
+
+
+def _normalize_error(error_text):
+    for pattern, replacement in _ERROR_NOISE:
+        error_text = pattern.sub(replacement, error_text)
+    return error_text
+
+
+def _fix_cache_key(build_output, gradle_properties, build_gradle):
+    # Key on the error the LLM actually sees, minus timestamps, durations and
+    # line numbers, so a recurring failure hits even if those details moved
+    error_text = _normalize_error(parse_gradle_error_for_llm(build_output))
+    # Any edit to the project files changes the key and invalidates the answer
+    h = hashlib.blake2b(error_text.encode())
+    for content in (gradle_properties, build_gradle):
+        h.update(b"\0" + (content or "").encode())
+    return h.hexdigest()
+
+
+def _canonical_repo_path(github_url):
+    # "host/owner/repo" with any trailing slash, ".git", query or fragment dropped
+    parts = urlsplit(github_url)
+    return (parts.netloc + parts.path).rstrip("/").removesuffix(".git")
+
+
+def _repo_dir_name(github_url):
+    return _canonical_repo_path(github_url).rsplit("/", 1)[-1]
+
+
+def get_repo_lock(github_url):
+    # One lock per checkout directory, shared by every spelling of its URL
+    repo_dir = get_repo_dir(github_url)
+    with _REPO_LOCKS_LOCK:
+        return _REPO_LOCKS.setdefault(repo_dir, threading.Lock())
+
+
+@functools.lru_cache(maxsize=256)
+def get_repo_dir(github_url):
+    # Suffix with a hash of the URL so forks sharing a repo name don't collide;
+    # spellings of the same repository URL share one checkout
+    url_hash = hashlib.sha1(_canonical_repo_path(github_url).encode()).hexdigest()[:8]
+    return _TEMP_ROOT / f"{_repo_dir_name(github_url)}-{url_hash}"
+
+
+def clone_repo(github_url, repo_dir):
+    from git import Repo
+
+    # Only the latest commit is needed to build
+    Repo.clone_from(github_url, repo_dir, depth=1, single_branch=True, no_tags=True)
+
+
+def _remove_readonly(func, path, _exc_info):
+    # Git marks object files read-only, which rmtree can't delete on Windows
+    os.chmod(path, stat.S_IWRITE)
+    func(path)
+
+
+def refresh_repo(github_url, repo_dir):
+    from git import Repo
 
-    prompt = PromptTemplate.from_template("""
+    if os.path.exists(os.path.join(repo_dir, ".git")):
+        # Update the existing checkout in place: only changed files are
+        # touched and Gradle's build directories survive for incremental builds
+        try:
+            print(f"[Step 1.1] Repository already exists at {repo_dir}, refreshing")
+            repo = Repo(repo_dir)
+            repo.remotes.origin.fetch(depth=1)
+            repo.git.reset("--hard", "FETCH_HEAD")
+            # Drop untracked files an earlier request created (e.g. a
+            # gradle.properties the project doesn't track); without -x the
+            # ignored build/ and .gradle/ outputs are kept
+            repo.git.clean("-fd")
+            print(f"[Step 1.2] Reset {repo_dir} to latest remote commit")
+            return
+        except Exception as e:
+            print(f"[Step 1.1] Refresh failed, cloning again: {str(e)}")
+    if os.path.exists(repo_dir):
+        shutil.rmtree(repo_dir, onerror=_remove_readonly)
+    print(f"[Step 1.1] Cloning repository {github_url}")
+    clone_repo(github_url, repo_dir)
+    print(f"[Step 1.2] Successfully cloned repository to {repo_dir}")
+
+
+_REACT_TEMPLATE = """
 You are a Gradle Build Fixing Agent. Your task is to help fix Gradle build issues by managing dependencies and analyzing build errors.
 
 Available tools:
@@ -78,12 +309,42 @@ Remember to:
 - Log your thinking process at each step
 
 {agent_scratchpad}
-""")
+"""
+
+
+@functools.cache
+def create_agent_executor(n_ctx=8192, temperature=0.2):
+    # LangChain is slow to import, so only load it when an agent is built
+    from langchain.agents import AgentExecutor, create_react_agent
+    from langchain.tools import Tool
+    from langchain_core.prompts import PromptTemplate
+
+    # Bind the temperature instead of loading a model configured with it,
+    # so agents with different temperatures share the pooled weights
+    llm = get_llm(model_path=MODEL_PATH, n_ctx=n_ctx).bind(temperature=temperature)
+
+    tools = [
+        Tool(
+            name="UpdateDependency",
+            func=update_dependency,
+            description="Updates the dependency version in gradle.properties"
+        ),
+        Tool(
+            name="GradleBuild",
+            func=run_gradle_build,
+            description="Runs gradle build and returns output"
+        ),
+        Tool(
+            name="FixBuild",
+            func=apply_fix,
+            description="Parses build error and applies fix in build.gradle or gradle.properties"
+        ),
+    ]
 
     agent = create_react_agent(
         llm=llm,
         tools=tools,
-        prompt=prompt,
+        prompt=PromptTemplate.from_template(_REACT_TEMPLATE),
     )
 
     return AgentExecutor.from_agent_and_tools(
@@ -99,61 +360,44 @@ def update_dependency(inputs):
     name = inputs.get("dependency_name")
     version = inputs.get("dependency_version")
     
-    # Create temp directory in agent_app folder
-    project_temp_dir = os.path.join(os.path.dirname(__file__), "temp")
-    os.makedirs(project_temp_dir, exist_ok=True)
-    
-    # Create a unique directory for this repo
-    repo_name = github_url.split("/")[-1].replace(".git", "")
-    repo_dir = os.path.join(project_temp_dir, repo_name)
+    # Create a unique directory for this repo in agent_app/temp
+    repo_dir = get_repo_dir(github_url)
+    os.makedirs(_TEMP_ROOT, exist_ok=True)
     
     print(f"\n[Step 1] Checking repository at {repo_dir}")
     
-    # Clone repository only if it doesn't exist
-    if not os.path.exists(repo_dir):
-        print(f"[Step 1.1] Cloning repository {github_url}")
-        try:
-            Repo.clone_from(github_url, repo_dir)
-            print(f"[Step 1.2] Successfully cloned repository to {repo_dir}")
-        except Exception as e:
-            print(f"[Step 1] Error during repository setup: {str(e)}")
-            raise
-    else:
-        print(f"[Step 1.1] Repository already exists at {repo_dir}")
+    try:
+        refresh_repo(github_url, repo_dir)
+    except Exception as e:
+        print(f"[Step 1] Error during repository setup: {str(e)}")
+        raise
 
     print(f"[Step 2] Updating dependency {name} to version {version}")
     
     # Update dependency in gradle.properties
     gradle_props_path = os.path.join(repo_dir, "gradle.properties")
-    if os.path.exists(gradle_props_path):
-        with open(gradle_props_path, "r") as f:
-            lines = f.readlines()
-        
-        updated = False
-        with open(gradle_props_path, "w") as f:
-            for line in lines:
-                if line.strip().startswith(f"{name}="):
-                    f.write(f"{name}={version}\n")
-                    updated = True
-                    print(f"[Step 3] Updated existing dependency in gradle.properties")
-                else:
-                    f.write(line)
-            if not updated:
-                f.write(f"\n{name}={version}\n")
-                print(f"[Step 3] Added new dependency to gradle.properties")
-    else:
-        # Create gradle.properties if it doesn't exist
-        with open(gradle_props_path, "w") as f:
-            f.write(f"{name}={version}\n")
-        print(f"[Step 3] Created new gradle.properties with dependency")
+    _set_gradle_property(gradle_props_path, name, version)
+    _ensure_perf_props(gradle_props_path)
 
     return f"Dependency {name} updated to version {version} in {repo_dir}"
 
 
+def _kill_build(proc):
+    # The wrapper runs the Gradle client as a child that keeps the output
+    # pipe open, so the whole process group has to go, not just the wrapper
+    if os.name == "nt":
+        subprocess.run(["taskkill", "/T", "/F", "/PID", str(proc.pid)],
+                       stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    else:
+        try:
+            os.killpg(proc.pid, signal.SIGKILL)
+        except ProcessLookupError:
+            pass
+
+
 def run_gradle_build(inputs):
     github_url = inputs.get("github_url")
-    repo_name = github_url.split("/")[-1].replace(".git", "")
-    repo_dir = os.path.join(os.path.dirname(__file__), "temp", repo_name)
+    repo_dir = get_repo_dir(github_url)
     
     print(f"\n[Step 4] Running Gradle build in {repo_dir}")
     
@@ -170,21 +414,63 @@ def run_gradle_build(inputs):
         if not gradlew_path.endswith('.bat'):
             os.chmod(gradlew_path, 0o755)
 
-        # Run the build
-        result = subprocess.run(
-            [gradlew_path, "clean", "build"],
-            cwd=repo_dir,
-            capture_output=True,
-            text=True,
-            timeout=300
-        )
+        # Fix attempts only need compilation and dependency resolution to pass,
+        # so tests run only when asked for
+        tasks = ["build"] if inputs.get("run_tests") else ["assemble", "-x", "test"]
+        env = dict(os.environ)
+        env.setdefault("GRADLE_OPTS", GRADLE_OPTS)
+
+        # Run the build, streaming its output into a bounded tail buffer
+        cmd = [gradlew_path, *GRADLE_FLAGS, *tasks]
+        with _BUILD_SLOTS:
+            proc = subprocess.Popen(
+                cmd,
+                cwd=repo_dir,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.STDOUT,
+                text=True,
+                # A stray undecodable byte from a compiler or test must not
+                # abort reading the rest of the stream
+                errors="replace",
+                env=env,
+                **_NEW_PROCESS_GROUP
+            )
+            # Killing the build on timeout also ends the read loop below
+            timed_out = threading.Event()
+
+            def _on_timeout():
+                timed_out.set()
+                _kill_build(proc)
+
+            timer = threading.Timer(BUILD_TIMEOUT, _on_timeout)
+            timer.start()
+            tail = deque(maxlen=BUILD_TAIL_LINES)
+            lines_after_failure = None
+            try:
+                for line in proc.stdout:
+                    tail.append(line)
+                    if lines_after_failure is None:
+                        if "FAILURE: Build failed" in line:
+                            lines_after_failure = 0
+                    else:
+                        lines_after_failure += 1
+                        if lines_after_failure >= FAILURE_GRACE_LINES:
+                            print("[Step 4.2] Build failure reported, stopping Gradle early")
+                            _kill_build(proc)
+                            break
+                returncode = proc.wait()
+            finally:
+                timer.cancel()
+                proc.stdout.close()
+        if timed_out.is_set():
+            raise subprocess.TimeoutExpired(cmd, BUILD_TIMEOUT)
         
-        if result.returncode == 0:
+        if returncode == 0:
             print("[Step 5] Build succeeded")
             return "Build succeeded."
         else:
             print("[Step 5] Build failed. Analyzing error output...")
-            error_output = result.stdout + "\n" + result.stderr
+            error_output = "".join(tail)
             print(f"Error output:\n{error_output}")
             return error_output
     except FileNotFoundError as e:
@@ -197,45 +483,113 @@ def run_gradle_build(inputs):
         return error_msg
 
 
-def apply_fix(build_output: str):
+def suggest_fixes(build_output, github_url=None, n=1):
+    # Generator over up to n distinct candidate fixes, decoded lazily
+    github_url = github_url or extract_repo_url(build_output)
+    repo_dir = get_repo_dir(github_url)
+    build_gradle_path = os.path.join(repo_dir, "build.gradle")
+    gradle_props_path = os.path.join(repo_dir, "gradle.properties")
+    gradle_properties = _cached_read(gradle_props_path) if os.path.exists(gradle_props_path) else None
+    build_gradle = _cached_read(build_gradle_path) if os.path.exists(build_gradle_path) else None
+    cache_key = _fix_cache_key(build_output, gradle_properties, build_gradle)
+    with _FIX_CACHE_LOCK:
+        known_good = list(_FIX_CACHE.get(cache_key, ()))
+    if known_good:
+        print("[Step 6.1] Same error and project files as before, reusing fixes that built")
+
+    # Fixes that built before come first; the LLM is only asked for more
+    # once those are used up
+    seen = set()
+    for suggestion in known_good[:n]:
+        seen.add(suggestion)
+        yield suggestion
+    for suggestion in ask_llm_for_fixes(build_output, n - len(seen)):
+        if suggestion not in seen:
+            seen.add(suggestion)
+            yield suggestion
+
+
+def record_fix_result(build_output, github_url, original_files, suggestion, passed):
+    # Report whether a suggestion's build passed. original_files is the
+    # snapshot_fix_targets() taken before it was applied, i.e. the files the
+    # suggestion was made for
+    repo_dir = get_repo_dir(github_url)
+    cache_key = _fix_cache_key(
+        build_output,
+        original_files.get(os.path.join(repo_dir, "gradle.properties")),
+        original_files.get(os.path.join(repo_dir, "build.gradle")),
+    )
+    with _FIX_CACHE_LOCK:
+        fixes = _FIX_CACHE.get(cache_key)
+        if passed:
+            if fixes is None:
+                if len(_FIX_CACHE) >= _FIX_CACHE_SIZE:
+                    _FIX_CACHE.pop(next(iter(_FIX_CACHE)))
+                fixes = _FIX_CACHE[cache_key] = []
+            if suggestion not in fixes:
+                fixes.append(suggestion)
+        elif fixes is not None and suggestion in fixes:
+            fixes.remove(suggestion)
+
+
+def apply_fix(build_output: str, github_url=None, suggestion=None):
     print("\n[Step 6] Analyzing build error and suggesting fix...")
-    suggestion = ask_llm_for_fix(build_output)
-    github_url = extract_repo_url(build_output)
-    repo_name = github_url.split("/")[-1].replace(".git", "")
-    repo_dir = os.path.join(os.path.dirname(__file__), "temp", repo_name)
+    github_url = github_url or extract_repo_url(build_output)
+    repo_dir = get_repo_dir(github_url)
+    build_gradle_path = os.path.join(repo_dir, "build.gradle")
+    gradle_props_path = os.path.join(repo_dir, "gradle.properties")
+
+    if suggestion is None:
+        suggestion = next(suggest_fixes(build_output, github_url))
 
     print(f"[Step 7] Raw LLM suggestion: {suggestion}")
 
     try:
-        # Just get the fix line
-        if "FIX:" not in suggestion:
+        # Pick up all labelled lines in one pass, keeping the first of each
+        fields = {}
+        for label, value in _SUGGESTION_RE.findall(suggestion):
+            fields.setdefault(label, value.strip())
+
+        if not fields.get("FIX"):
             print("[Step 7.1] No FIX: found in suggestion")
             return "Error: Invalid suggestion format"
             
-        fix = suggestion.split("FIX:")[1].strip()
-        print(f"[Step 7.2] Extracted fix: {fix}")
+        fix = fields["FIX"]
+        print(f"[Step 7.2] Extracted fix: {fix} (error type: {fields.get('ERROR_TYPE')}, file: {fields.get('FILE_TO_MODIFY')})")
         
+        # The model may quote the file name or give it a path
+        target = os.path.basename(fields.get("FILE_TO_MODIFY", "build.gradle").strip("`'\" "))
+        if target not in _FIX_TARGETS:
+            print(f"[Step 7.3] Unsupported file to modify: {fields['FILE_TO_MODIFY']}")
+            return f"No fix applied - unsupported file {fields['FILE_TO_MODIFY']}"
+
+        if target == "gradle.properties":
+            # Property fixes come as "name=value" and are patched in place
+            name, sep, value = fix.partition("=")
+            if not sep or not name.strip():
+                print(f"[Step 7.3] gradle.properties fix is not a name=value pair: {fix}")
+                return "No fix applied - gradle.properties fix is not a name=value pair"
+            _set_gradle_property(gradle_props_path, name.strip(), value.strip())
+            print("[Step 8] Fix applied to gradle.properties")
+            return f"Applied fix to gradle.properties: {fix}"
+
         # Apply the fix to build.gradle
-        build_gradle_path = os.path.join(repo_dir, "build.gradle")
         print(f"[Step 7.3] Looking for build.gradle at: {build_gradle_path}")
         
         if os.path.exists(build_gradle_path):
             print("[Step 7.4] Found build.gradle, reading current content...")
-            with open(build_gradle_path, 'r') as f:
-                lines = f.readlines()
-                print("[Step 7.5] Current build.gradle content:")
-                for line in lines:
-                    print(f"  {line.strip()}")
+            text = _cached_read(build_gradle_path)
+            if DEBUG:
+                print(f"[Step 7.5] Current build.gradle content:\n{text}")
             
             print("[Step 7.6] Applying fix...")
-            with open(build_gradle_path, 'w') as f:
-                for line in lines:
-                    if "implementation" in line and "spring-boot-starter-web" in line:
-                        print(f"[Step 7.7] Found line to replace: {line.strip()}")
-                        print(f"[Step 7.8] Replacing with: {fix}")
-                        f.write(f"{fix}\n")
-                    else:
-                        f.write(line)
+            match = _SPRING_WEB_DEP_RE.search(text)
+            if not match:
+                print("[Step 7.7] No spring-boot-starter-web dependency found in build.gradle")
+                return "No fix applied - dependency line not found in build.gradle"
+            print(f"[Step 7.7] Found line to replace: {match.group(0).strip()}")
+            print(f"[Step 7.8] Replacing with: {fix}")
+            _atomic_write(build_gradle_path, text[:match.start()] + fix + text[match.end():])
             
             print("[Step 8] Fix applied to build.gradle")
             return f"Applied fix to build.gradle: {fix}"
@@ -248,6 +602,26 @@ def apply_fix(build_output: str):
         return f"Error applying fix: {str(e)}"
 
 
+def snapshot_fix_targets(github_url):
+    # Contents of the files apply_fix may patch, None for missing ones
+    repo_dir = get_repo_dir(github_url)
+    snapshot = {}
+    for name in _FIX_TARGETS:
+        path = os.path.join(repo_dir, name)
+        snapshot[path] = _cached_read(path) if os.path.exists(path) else None
+    return snapshot
+
+
+def restore_fix_targets(snapshot):
+    # Undo earlier fixes so each candidate applies to the original files
+    for path, text in snapshot.items():
+        if text is None:
+            if os.path.exists(path):
+                os.remove(path)
+        elif not os.path.exists(path) or _cached_read(path) != text:
+            _atomic_write(path, text)
+
+
 def extract_repo_url(output):
     # Extract github URL from the output or use a default
     # This is a simplified version - you might want to enhance this
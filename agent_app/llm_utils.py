@@ -1,20 +1,120 @@
 # llm_utils.py
-from langchain_community.llms import LlamaCpp
+import functools
+import inspect
+import os
+import re
+import threading
 
-MODEL_PATH = "C:\\Users\\karth\\models\\Nous-Hermes-2-Mistral-7B-DPO.Q4_K_M.gguf"
+# llama_cpp and LangChain are imported inside get_llm(): they take a long
+# time to import and most code paths never need the model
 
-llm = LlamaCpp(
-    model_path=MODEL_PATH,
-    n_ctx=8192,
-    temperature=0.2,
-    verbose=True,
+# Point LLM_MODEL_PATH at a smaller quantization (e.g. Q4_0) for faster decoding
+MODEL_PATH = os.getenv("LLM_MODEL_PATH", "C:\\Users\\karth\\models\\Nous-Hermes-2-Mistral-7B-DPO.Q4_K_M.gguf")
+# Fix suggestions mostly copy text out of the prompt, so prompt-lookup
+# speculative decoding drafts them almost for free; 0 disables it
+DRAFT_TOKENS = int(os.getenv("LLM_DRAFT_TOKENS", "10"))
+
+# Prompts carry the whole build output, so prefill dominates: use every core
+# (llama.cpp stops scaling past ~16 threads) and a large prompt batch
+N_THREADS = min(os.cpu_count() or 8, 16)
+N_BATCH = 2048
+N_UBATCH = 512
+# Sampling temperature used when a call doesn't pass its own
+DEFAULT_TEMPERATURE = 0.2
+
+# Loading a gguf model takes seconds, so every caller asking for the same
+# configuration shares one LlamaCpp handle
+_LLM_POOL = {}
+_LLM_POOL_LOCK = threading.Lock()
+# A llama.cpp context can only run one generation at a time
+_LLM_LOCK = threading.Lock()
+
+
+def get_llm(model_path=MODEL_PATH, n_ctx=8192, n_gpu_layers=None, n_batch=N_BATCH, draft_tokens=DRAFT_TOKENS):
+    import llama_cpp
+
+    # Offload all layers by default when llama-cpp-python was built with GPU support
+    if n_gpu_layers is None and getattr(llama_cpp, "llama_supports_gpu_offload", lambda: False)():
+        n_gpu_layers = -1
+    # Sampling settings aren't part of the key: they are passed per call, so
+    # they never cost another copy of the weights
+    key = (model_path, n_ctx, n_gpu_layers, n_batch, draft_tokens)
+    with _LLM_POOL_LOCK:
+        if key not in _LLM_POOL:
+            from langchain_community.llms import LlamaCpp
+            from llama_cpp.llama_speculative import LlamaPromptLookupDecoding
+
+            model_kwargs = {"n_threads_batch": N_THREADS}
+            # n_ubatch only exists in newer llama-cpp-python releases
+            if "n_ubatch" in inspect.signature(llama_cpp.Llama.__init__).parameters:
+                model_kwargs["n_ubatch"] = min(N_UBATCH, n_batch)
+            if draft_tokens:
+                model_kwargs["draft_model"] = LlamaPromptLookupDecoding(num_pred_tokens=draft_tokens)
+            _LLM_POOL[key] = LlamaCpp(
+                model_path=model_path,
+                n_ctx=n_ctx,
+                n_gpu_layers=n_gpu_layers,
+                n_batch=n_batch,
+                n_threads=N_THREADS,
+                temperature=DEFAULT_TEMPERATURE,
+                # Pin the weights in RAM so they are never paged out between requests
+                use_mlock=True,
+                # llama.cpp's per-call timing logs are costly on the hot path
+                verbose=False,
+                model_kwargs=model_kwargs,
+            )
+        return _LLM_POOL[key]
+
+
+# Lines in a Gradle log that explain why the build failed. Each alternative
+# names the part worth keeping, so one scan over the log finds all of them
+_ERROR_RE = re.compile(
+    "|".join(
+        (
+            r"\* What went wrong:\s*(?P<went_wrong>.*?)(?=\n\* Try:|\Z)",
+            r"(?P<unresolved>Could not resolve [^\n]+)",
+            r"(?P<not_found>Could not find [^\n]+)",
+            r"(?P<jvm_version>Dependency requires at least JVM runtime version [^\n]+)",
+            r"(?P<incompatible>Incompatible because [^\n]+)",
+            r"(?P<compiler>error: [^\n]+)",
+        )
+    ),
+    re.DOTALL | re.IGNORECASE,
 )
 
-def ask_llm_for_fix(build_output):
-    prompt = f"""
-{build_output}
 
-The error says to change Spring Boot version to one that supports JVM 11. 
+# Small cache: the same build output is parsed for the suggestion cache key
+# and again for the prompt
+@functools.lru_cache(maxsize=32)
+def parse_gradle_error_for_llm(build_output):
+    # Hand the LLM only the failure explanation instead of the whole log
+    extracted_errors = []
+    # len("\n".join(extracted_errors)), kept up to date without re-joining;
+    # starts at -1 because the first entry has no separator
+    running_len = -1
+    for match in _ERROR_RE.finditer(build_output):
+        extracted_errors.append(match.group(match.lastgroup).strip())
+        running_len += len(extracted_errors[-1]) + 1
+        if running_len > 1500:
+            break
+    # A single "What went wrong" block is the usual case; return it as is
+    if len(extracted_errors) == 1:
+        return extracted_errors[0]
+    if extracted_errors:
+        return "\n".join(extracted_errors)
+    # Nothing recognizable matched; fall back to the last 50 lines of the log,
+    # splitting only from the end so a huge log isn't broken into a full list
+    tail = build_output.rsplit("\n", 51)
+    if tail[-1] == "":
+        tail.pop()
+    return "\n".join(tail[-50:])
+
+
+# Static instructions go first so the prompt prefix is identical on every
+# attempt; llama.cpp keeps the tokens it last evaluated and only prefills
+# what differs from them, i.e. the build output
+_FIX_PROMPT_HEAD = """
+The error in the build output below says to change Spring Boot version to one that supports JVM 11.
 
 COPY AND PASTE EXACTLY THESE THREE LINES, DO NOT MODIFY THEM:
 
@@ -23,5 +123,68 @@ FILE_TO_MODIFY: build.gradle
 FIX: implementation 'org.springframework.boot:spring-boot-starter-web:2.7.0'
 
 DO NOT ADD ANY OTHER TEXT. DO NOT EXPLAIN. JUST THOSE THREE LINES.
+
+BUILD OUTPUT:
 """
-    return llm.invoke(prompt).strip()
+
+_FIX_PROMPT_TAIL = """
+
+YOUR THREE LINES:
+"""
+
+
+# The answer is complete once the FIX: line has been terminated
+_FIX_DONE_RE = re.compile(r"FIX:[^\n]*\S[^\n]*\n")
+# Also end generation when the model drifts into echoing the instructions
+# or inventing examples instead of answering
+_FIX_STOP = ["\n\n\n", "---", "Example", "DO NOT"]
+
+# Bounds on prefill (error text fed in) and decode (the three-line answer
+# is about 40 tokens)
+MAX_ERROR_CHARS = 4000
+FIX_MAX_TOKENS = 96
+# Sampling temperature added for each extra candidate fix
+FIX_TEMPERATURE_STEP = 0.2
+
+# Token ids of _FIX_PROMPT_HEAD per llama.cpp model, tokenized on first use
+_FIX_HEAD_TOKENS = {}
+
+
+def ask_llm_for_fixes(build_output, n=1):
+    # Generator: a candidate is only decoded when the caller asks for it, so
+    # a first fix that works costs a single decode. Candidate i is sampled at
+    # a temperature raised by i steps to keep candidates from all being the
+    # same answer. Repeats are yielded too, callers skip the ones they have seen
+    llm = get_llm()
+    client = llm.client
+    # Call llama.cpp directly with token ids so the static head is not
+    # re-tokenized on every attempt; only the build output is new
+    head_tokens = _FIX_HEAD_TOKENS.get(client)
+    if head_tokens is None:
+        head_tokens = _FIX_HEAD_TOKENS[client] = client.tokenize(_FIX_PROMPT_HEAD.encode(), add_bos=True)
+    # The fallback tail can still be long (stack traces), so cap the prompt size
+    error_text = parse_gradle_error_for_llm(build_output)[:MAX_ERROR_CHARS]
+    tokens = head_tokens + client.tokenize((error_text + _FIX_PROMPT_TAIL).encode(), add_bos=False)
+
+    for i in range(n):
+        # Hold the model only while decoding, not while the caller builds
+        with _LLM_LOCK:
+            response = ""
+            for chunk in client.create_completion(
+                tokens,
+                max_tokens=FIX_MAX_TOKENS,
+                temperature=llm.temperature + FIX_TEMPERATURE_STEP * i,
+                top_p=llm.top_p,
+                top_k=llm.top_k,
+                repeat_penalty=llm.repeat_penalty,
+                stop=_FIX_STOP,
+                stream=True,
+            ):
+                response += chunk["choices"][0]["text"]
+                if _FIX_DONE_RE.search(response):
+                    break
+        yield response.strip()
+
+
+def ask_llm_for_fix(build_output):
+    return next(ask_llm_for_fixes(build_output))
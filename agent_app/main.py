@@ -2,11 +2,23 @@
 from fastapi import FastAPI
 from pydantic import BaseModel
 import uvicorn
-from core_agent import create_agent_executor, update_dependency, run_gradle_build, apply_fix
+from core_agent import (update_dependency, run_gradle_build, suggest_fixes, apply_fix, get_repo_dir,
+                        get_repo_lock, snapshot_fix_targets, restore_fix_targets, record_fix_result,
+                        MAX_CONCURRENT_BUILDS)
+from llm_utils import get_llm
 import os
-from git import Repo
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app):
+    # Load the model once at startup; every request and retry then reuses
+    # the same pooled llama.cpp context instead of paying for the load
+    print("[API] Loading LLM...")
+    get_llm()
+    yield
+
+app = FastAPI(lifespan=lifespan)
 
 class FixRequest(BaseModel):
     github_url: str
@@ -15,20 +27,16 @@ class FixRequest(BaseModel):
 
 @app.post("/fix")
 def fix_dependency(request: FixRequest):
+    # Requests for the same repository share its checkout, so they take turns
+    with get_repo_lock(request.github_url):
+        return _fix_dependency(request)
+
+def _fix_dependency(request: FixRequest):
     print("\n[API] Starting dependency fix process...")
     
-    # Step 1: Download project to agent_app/temp
-    temp_dir = os.path.join(os.path.dirname(__file__), "temp")
-    os.makedirs(temp_dir, exist_ok=True)
-    
-    repo_name = request.github_url.split("/")[-1].replace(".git", "")
-    repo_dir = os.path.join(temp_dir, repo_name)
-    
-    print(f"[API] Cloning repository to {repo_dir}")
-    if os.path.exists(repo_dir):
-        import shutil
-        shutil.rmtree(repo_dir)
-    Repo.clone_from(request.github_url, repo_dir)
+    # Step 1: Project checkout lives in agent_app/temp; update_dependency
+    # clones it, or fetches and resets an existing copy to the remote head
+    repo_dir = get_repo_dir(request.github_url)
     
     # Step 2: Update dependency version
     print(f"[API] Updating dependency {request.dependency_name} to version {request.dependency_version}")
@@ -40,41 +48,54 @@ def fix_dependency(request: FixRequest):
     
     # Step 3: Run initial Gradle build
     print("[API] Running initial Gradle build")
-    build_result = run_gradle_build({"github_url": request.github_url})
+    build_result = run_gradle_build({"github_url": request.github_url, "run_tests": True})
     
     # Step 4: If build failed, try fixes with retry logic
     if "Build succeeded" not in build_result:
         print("[API] Initial build failed, starting fix attempts...")
         max_attempts = 3
-        attempt = 1
+        attempt = 0
         last_fix_result = None
+        # Candidates are alternatives: each one is applied to the files as
+        # they were before any fix
+        original_files = snapshot_fix_targets(request.github_url)
+        failed_build = build_result
         
-        while attempt <= max_attempts:
-            print(f"\n[API] Fix attempt {attempt} of {max_attempts}")
+        # Candidates share one prompt and are decoded one at a time, only
+        # when the previous candidate failed
+        for candidate in suggest_fixes(failed_build, request.github_url, n=max_attempts):
+            attempt += 1
+            print(f"\n[API] Fix attempt {attempt} of up to {max_attempts}")
+            restore_fix_targets(original_files)
             
-            # Get LLM suggestion and apply fix
-            fix_result = apply_fix(build_result)
+            # Apply the next candidate fix
+            fix_result = apply_fix(build_result, request.github_url, candidate)
             print(f"[API] Fix result: {fix_result}")
             
-            if "Error applying fix" in fix_result or "No fix applied" in fix_result:
-                print("[API] No valid fix received from LLM, stopping attempts")
-                break
+            if not fix_result.startswith("Applied fix"):
+                print("[API] Candidate fix could not be applied, trying the next one")
+                record_fix_result(failed_build, request.github_url, original_files, candidate, passed=False)
+                continue
                 
             last_fix_result = fix_result
             
             # Run build again to verify fix
             print(f"[API] Running build after fix attempt {attempt}")
             build_result = run_gradle_build({"github_url": request.github_url})
+            # Only fixes that built are kept for the next identical failure
+            record_fix_result(failed_build, request.github_url, original_files, candidate,
+                              passed="Build succeeded" in build_result)
             
             if "Build succeeded" in build_result:
                 print(f"[API] Build succeeded after {attempt} fix attempts")
+                # Attempts skip tests, so confirm the fix with a full build
+                print("[API] Running full build with tests")
+                build_result = run_gradle_build({"github_url": request.github_url, "run_tests": True})
                 break
-                
-            attempt += 1
         
         return {
             "initial_build": build_result,
-            "fix_attempts": attempt - 1,
+            "fix_attempts": attempt,
             "last_fix_applied": last_fix_result,
             "final_build": build_result,
             "repo_location": repo_dir,
@@ -87,5 +108,27 @@ def fix_dependency(request: FixRequest):
         "status": "success"
     }
 
+@app.post("/fix/batch")
+def fix_dependencies(requests: list[FixRequest]):
+    # Different projects run side by side, as many at once as builds may;
+    # requests for the same project wait for each other, and llm_utils
+    # serializes the LLM calls on the shared model
+    print(f"\n[API] Starting batch fix for {len(requests)} projects...")
+    workers = max(1, min(len(requests), MAX_CONCURRENT_BUILDS))
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(_fix_dependency_or_error, requests))
+
+def _fix_dependency_or_error(request: FixRequest):
+    # One failing project must not discard the results of the others
+    try:
+        return fix_dependency(request)
+    except Exception as e:
+        print(f"[API] Fix for {request.github_url} failed: {str(e)}")
+        return {
+            "github_url": request.github_url,
+            "error": str(e),
+            "status": "error"
+        }
+
 if __name__ == "__main__":
     uvicorn.run("main:app", host="0.0.0.0", port=8000, reload=True)